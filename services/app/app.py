@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
-import os, logging
-from flask import Flask, jsonify, render_template, request
+import os, logging, hashlib
+from flask import Flask, Response, render_template, request
+from flask.json.provider import JSONProvider
+from flask_caching import Cache
 from pymongo import MongoClient
 import certifi
+import orjson
 from datetime import datetime, timezone, timedelta
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
@@ -13,58 +16,132 @@ RAW_DB = os.getenv("RAW_DB", "raw_db")
 RAW_COLLECTION = os.getenv("RAW_COLLECTION", "raw_products")
 PROCESSED_DB = os.getenv("PROCESSED_DB", "processed_db")
 PROCESSED_COLLECTION = os.getenv("PROCESSED_COLLECTION", "products")
+# read endpoints are cached for one dashboard poll; the data only changes when the processor runs.
+# At least 1s: SimpleCache treats a timeout of 0 as "never expire"
+try:
+    CACHE_TIMEOUT = max(1, int(os.getenv("POLL_INTERVAL", "5")))
+except Exception:
+    CACHE_TIMEOUT = 5
 
 if not MONGO_URI:
     logger.error("MONGO_URI is not set. Exiting.")
     raise SystemExit(1)
 
-client = MongoClient(MONGO_URI, tls=True, tlsCAFile=certifi.where(), serverSelectionTimeoutMS=5000)
+# connect=False defers socket creation to the first query, i.e. inside each
+# gunicorn (gevent) worker rather than at import time
+client = MongoClient(MONGO_URI, tls=True, tlsCAFile=certifi.where(), serverSelectionTimeoutMS=5000, connect=False,
+                     maxPoolSize=32, minPoolSize=4, compressors='zstd,zlib', retryWrites=True, w='majority',
+                     uuidRepresentation='standard')
 raw_col = client[RAW_DB][RAW_COLLECTION]
 proc_col = client[PROCESSED_DB][PROCESSED_COLLECTION]
 insights_col = client[PROCESSED_DB]['insights']
 
+# fields of processed products used by the dashboard
+SUMMARY_PROJECTION = {
+    '_id': 0, 'product_id': 1, 'title': 1, 'category': 1, 'price': 1, 'avg_rating': 1,
+    'rating_count': 1, 'sentiment_score': 1, 'sentiment_label': 1, 'last_processed': 1
+}
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_NAIVE_UTC
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=ORJSON_OPTIONS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__, template_folder='templates')
+app.json = OrjsonProvider(app)
+cache = Cache(app, config={'CACHE_TYPE': 'SimpleCache', 'CACHE_DEFAULT_TIMEOUT': CACHE_TIMEOUT})
+
+def _json(payload, status=200):
+    return Response(orjson.dumps(payload, option=ORJSON_OPTIONS), status=status, mimetype='application/json')
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def _etag(*parts):
+    return hashlib.blake2b('|'.join(str(p) for p in parts).encode(), digest_size=8).hexdigest()
+
+@cache.memoize()
+def _summary_etag():
+    # processed data only changes when the processor writes, which bumps last_processed
+    latest = proc_col.find_one({}, {'last_processed': 1, '_id': 0}, sort=[('last_processed', -1)])
+    return _etag((latest or {}).get('last_processed') or '')
+
+@cache.memoize()
+def _daily_etag():
+    # the daily report also counts raw docs over a rolling 24h window, so the tag moves
+    # whenever a doc enters (newest) or leaves (oldest in window) that window
+    since_ms = int((datetime.now(timezone.utc) - timedelta(days=1)).timestamp() * 1000)
+    newest = raw_col.find_one({}, {'ingested_at': 1, '_id': 0}, sort=[('ingested_at', -1)])
+    oldest = raw_col.find_one({'ingested_at': {'$gte': since_ms}}, {'ingested_at': 1, '_id': 0}, sort=[('ingested_at', 1)])
+    return _etag(_summary_etag(), (newest or {}).get('ingested_at'), (oldest or {}).get('ingested_at'))
+
+def _conditional(body_fn, etag_fn):
+    """Serve body_fn(etag) with a weak ETag, or an empty 304 if the client already has it."""
+    etag = etag_fn()
+    if request.if_none_match.contains_weak(etag):
+        resp = Response(status=304)
+    else:
+        # bodies are memoized per etag so a cached body never outlives the data it was built from
+        resp = Response(body_fn(etag), mimetype='application/json')
+    resp.set_etag(etag, weak=True)
+    resp.cache_control.max_age = CACHE_TIMEOUT
+    return resp
+
+@cache.memoize()
+def _summary_body(etag):
+    cur = proc_col.find({}, SUMMARY_PROJECTION).sort('last_processed', -1).batch_size(500)
+    return orjson.dumps({'status': 'ok', 'data': list(cur)}, option=ORJSON_OPTIONS)
+
+@cache.memoize()
+def _latest_body(limit):
+    docs = list(raw_col.find({}, {'_id':0}).sort('ingested_at', -1).limit(limit))
+    return orjson.dumps({'status':'ok', 'data':docs}, option=ORJSON_OPTIONS)
+
+@cache.memoize()
+def _daily_body(etag):
+    now = datetime.now(timezone.utc)
+    since_ms = int((now - timedelta(days=1)).timestamp() * 1000)
+    recent = {'ingested_at': {'$gte': since_ms}}
+    total = raw_col.count_documents(recent)
+    # count and rank mentions server-side; only the top 10 rows come back
+    top = list(raw_col.aggregate([
+        {'$match': recent},
+        {'$group': {'_id': '$product_id', 'mentions': {'$sum': 1}}},
+        {'$sort': {'mentions': -1}},
+        {'$limit': 10},
+        {'$project': {'_id': 0, 'product_id': '$_id', 'mentions': 1}}
+    ]))
+    insights = insights_col.find_one({'_id':'latest'})
+    return orjson.dumps({'status':'ok', 'data': {'total_posts': total, 'top_mentions': top, 'insights': insights}}, option=ORJSON_OPTIONS)
+
 @app.route('/api/summary')
 def api_summary():
     try:
-        docs = list(proc_col.find({}, {'_id':0}).sort('last_processed', -1))
-        return jsonify({'status':'ok', 'data':docs})
+        return _conditional(_summary_body, _summary_etag)
     except Exception as e:
         logger.exception("Error in /api/summary: %s", e)
-        return jsonify({'status':'error','message':'internal error'}),500
+        return _json({'status':'error','message':'internal error'}, 500)
 
 @app.route('/api/latest_products')
 def api_latest():
     try:
         limit = int(request.args.get('limit', '5'))
-        docs = list(raw_col.find({}, {'_id':0}).sort('ingested_at', -1).limit(limit))
-        return jsonify({'status':'ok', 'data':docs})
+        return Response(_latest_body(limit), mimetype='application/json')
     except Exception as e:
         logger.exception("Error in /api/latest_products: %s", e)
-        return jsonify({'status':'error','message':'internal error'}),500
+        return _json({'status':'error','message':'internal error'}, 500)
 
 @app.route('/api/reports/daily')
 def api_daily():
     try:
-        now = datetime.now(timezone.utc)
-        since_ms = int((now - timedelta(days=1)).timestamp() * 1000)
-        recent_raw = list(raw_col.find({'ingested_at': {'$gte': since_ms}}))
-        total = len(recent_raw)
-        counts = {}
-        for d in recent_raw:
-            pid = int(d.get('product_id') or 0)
-            counts[pid] = counts.get(pid, 0) + 1
-        top = sorted([{'product_id':k,'mentions':v} for k,v in counts.items()], key=lambda x: x['mentions'], reverse=True)[:10]
-        insights = insights_col.find_one({'_id':'latest'}) or insights_col.find_one({})
-        return jsonify({'status':'ok', 'data': {'total_posts': total, 'top_mentions': top, 'insights': insights}})
+        return _conditional(_daily_body, _daily_etag)
     except Exception as e:
         logger.exception("Error in /api/reports/daily: %s", e)
-        return jsonify({'status':'error','message':'internal error'}),500
-
-if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000)
+        return _json({'status':'error','message':'internal error'}, 500)
@@ -1,8 +1,10 @@
 #!/usr/bin/env python3
 import os, time, logging
-from pymongo import MongoClient, errors
+from pymongo import MongoClient, UpdateOne, WriteConcern, errors
 import certifi
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+import numpy as np
+from numba import njit, prange
+from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer, SentiText, BOOSTER_DICT
 from datetime import datetime, timezone
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
@@ -17,43 +19,188 @@ try:
     PROCESS_INTERVAL = int(os.getenv("PROCESS_INTERVAL", "5"))
 except Exception:
     PROCESS_INTERVAL = 5
+# max raw documents handled per process_batch call
+BATCH_LIMIT = 500
+# change stream consumer drains after this many inserts or STREAM_FLUSH_SECONDS after the first
+STREAM_BUFFER_SIZE = 100
+STREAM_FLUSH_SECONDS = 1.0
 
 if not MONGO_URI:
     logger.error("MONGO_URI is not set. Exiting.")
     raise SystemExit(1)
 
-client = MongoClient(MONGO_URI, tls=True, tlsCAFile=certifi.where(), serverSelectionTimeoutMS=5000)
+client = MongoClient(MONGO_URI, tls=True, tlsCAFile=certifi.where(), serverSelectionTimeoutMS=5000,
+                     maxPoolSize=32, minPoolSize=4, compressors='zstd,zlib', retryWrites=True, w='majority',
+                     uuidRepresentation='standard')
 raw_col = client[RAW_DB][RAW_COLLECTION]
 proc_col = client[PROCESSED_DB][PROCESSED_COLLECTION]
+# processed products are derived analytics that the next scrape rewrites anyway, so their
+# bulk upserts only wait for the primary; insights and the watermark keep w='majority'
+proc_col_fast = proc_col.with_options(write_concern=WriteConcern(w=1, j=False))
 insights_col = client[PROCESSED_DB]['insights']
 
 analyzer = SentimentIntensityAnalyzer()
+# compound score memoized by hash(title + description); the source API returns
+# the same products every scrape, so most texts are scored only once
+SENT_CACHE = {}
+SENT_CACHE_SIZE = 10000
+# _id of the newest raw document processed so far, persisted in insights_col
+WATERMARK_ID = 'processor_cursor'
+last_id = None
 
-def analyze_product(doc):
+def ensure_indexes():
+    """Create the indexes used by the processor backlog query and the app's read endpoints."""
+    # the backlog query is a range read on the built-in _id index
+    # /api/latest_products sorts by newest ingestion
+    raw_col.create_index([('ingested_at', -1)])
+    # per-product upsert filter
+    proc_col.create_index([('product_id', 1)], unique=True)
+    # /api/summary sorts by last_processed
+    proc_col.create_index([('last_processed', -1)])
+
+def load_watermark():
+    """Load the persisted `last_id`, seeding it from the `processed` flag written by older processors."""
+    global last_id
+    state = insights_col.find_one({'_id': WATERMARK_ID})
+    if state:
+        last_id = state.get('last_id')
+    else:
+        seed = raw_col.find_one({'processed': True}, {'_id': 1}, sort=[('_id', -1)])
+        last_id = seed['_id'] if seed else None
+    logger.info("Processing raw documents after _id %s", last_id)
+
+def save_watermark(new_id):
+    global last_id
+    insights_col.update_one({'_id': WATERMARK_ID}, {'$set': {'last_id': new_id}}, upsert=True)
+    last_id = new_id
+
+def _token_valences(text):
+    """Per-token valences and punctuation amplifier for `text`.
+
+    Mirrors SentimentIntensityAnalyzer.polarity_scores up to the final scoring
+    step, which _compound_batch performs natively for the whole batch.
+    """
+    # convert emojis to their textual descriptions
+    emojis = analyzer.emojis
+    parts = []
+    prev_space = True
+    for ch in text:
+        if ch in emojis:
+            if not prev_space:
+                parts.append(' ')
+            parts.append(emojis[ch])
+            prev_space = False
+        else:
+            parts.append(ch)
+            prev_space = ch == ' '
+    text = ''.join(parts).strip()
+
+    sentitext = SentiText(text)
+    words = sentitext.words_and_emoticons
+    sentiments = []
+    for i, item in enumerate(words):
+        lowered = item.lower()
+        # vader_lexicon words used as modifiers or negations carry no valence themselves
+        if lowered in BOOSTER_DICT or (lowered == 'kind' and i < len(words) - 1 and words[i + 1].lower() == 'of'):
+            sentiments.append(0)
+            continue
+        sentiments = analyzer.sentiment_valence(0, sentitext, item, i, sentiments)
+    sentiments = analyzer._but_check(words, sentiments)
+    return sentiments, analyzer._punctuation_emphasis(text)
+
+@njit(cache=True, fastmath=True)
+def _compound(valences, punct):
+    # VADER's score_valence + normalize(alpha=15) for a single document
+    if valences.size == 0:
+        return 0.0
+    sum_s = 0.0
+    for v in valences:
+        sum_s += v
+    if sum_s > 0:
+        sum_s += punct
+    elif sum_s < 0:
+        sum_s -= punct
+    norm = sum_s / np.sqrt(sum_s * sum_s + 15.0)
+    return min(1.0, max(-1.0, norm))
+
+@njit(cache=True, parallel=True)
+def _compound_batch(valences, offsets, punct):
+    # valences is a flat (CSR) array; doc i owns valences[offsets[i]:offsets[i + 1]]
+    n = offsets.size - 1
+    out = np.empty(n, dtype=np.float64)
+    for i in prange(n):
+        out[i] = _compound(valences[offsets[i]:offsets[i + 1]], punct[i])
+    return out
+
+def _score_texts(texts):
+    flat = []
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    punct = np.empty(len(texts), dtype=np.float64)
+    for i, text in enumerate(texts):
+        sentiments, punct[i] = _token_valences(text)
+        flat.extend(sentiments)
+        offsets[i + 1] = len(flat)
+    valences = np.asarray(flat, dtype=np.float64)
+    # polarity_scores rounds compound to 4 decimals
+    return np.round(_compound_batch(valences, offsets, punct), 4)
+
+def analyze_batch(docs):
+    """Score a list of raw docs in one pass; returns (scores, labels) as NumPy arrays."""
     # use title + description for a simple sentiment proxy
-    text = (doc.get('title') or '') + '. ' + (doc.get('description') or '')
-    s = analyzer.polarity_scores(text)
-    score = float(s.get('compound', 0.0))
-    label = 'neutral'
-    if score >= 0.05:
-        label = 'positive'
-    elif score <= -0.05:
-        label = 'negative'
-    return score, label
+    texts = [(d.get('title') or '') + '. ' + (d.get('description') or '') for d in docs]
+    keys = [hash(t) for t in texts]
+    misses = {}
+    for key, text in zip(keys, texts):
+        if key not in SENT_CACHE:
+            misses[key] = text
+    if misses:
+        if len(SENT_CACHE) + len(misses) > SENT_CACHE_SIZE:
+            SENT_CACHE.clear()
+        SENT_CACHE.update(zip(misses, _score_texts(list(misses.values())).tolist()))
+    scores = np.fromiter((SENT_CACHE[k] for k in keys), dtype=np.float64, count=len(keys))
+    labels = np.where(scores >= 0.05, 'positive', np.where(scores <= -0.05, 'negative', 'neutral'))
+    return scores, labels
+
+_INSIGHT_ROW = {'product_id': '$product_id', 'title': '$title', 'score': '$sentiment_score'}
+# recompute the 'latest' insights doc over all processed products without leaving the server
+INSIGHTS_PIPELINE = [
+    {'$group': {
+        '_id': None,
+        'avg_sentiment': {'$avg': '$sentiment_score'},
+        'top_positive': {'$topN': {'n': 5, 'sortBy': {'sentiment_score': -1}, 'output': _INSIGHT_ROW}},
+        # lowest five, highest first
+        'top_negative': {'$bottomN': {'n': 5, 'sortBy': {'sentiment_score': -1}, 'output': _INSIGHT_ROW}}
+    }},
+    {'$project': {
+        '_id': {'$literal': 'latest'},
+        'generated_at': {'$toString': '$$NOW'},
+        'top_positive': 1,
+        'top_negative': 1,
+        'avg_sentiment': 1
+    }},
+    {'$merge': {'into': insights_col.name, 'on': '_id', 'whenMatched': 'replace', 'whenNotMatched': 'insert'}}
+]
 
 def process_batch():
+    """Process the next batch of raw documents past the watermark; returns how many were written (0 on error)."""
+    processed_count = 0
     try:
-        # Only process raw documents that haven't been processed yet. This prevents
+        # Only process raw documents newer than the watermark. This prevents
         # re-processing the same items repeatedly when scraper upserts or when
         # the raw collection contains historical inserts.
-        cursor = raw_col.find({'processed': {'$ne': True}}).sort('ingested_at', 1).limit(500)
-        processed_count = 0
-        all_proc = []
-        for doc in cursor:
+        query = {'_id': {'$gt': last_id}} if last_id is not None else {}
+        docs = list(raw_col.find(query).sort('_id', 1).limit(BATCH_LIMIT))
+        if not docs:
+            # watermark has not moved: skip scoring, writes and the insights rewrite
+            return 0
+        scores, labels = analyze_batch(docs)
+        now = datetime.now(timezone.utc)
+        now_iso = now.isoformat()
+        now_ms = int(now.timestamp() * 1000)
+        # one upsert per product: docs are _id-sorted, so the newest raw copy wins
+        proc_ops = {}
+        for doc, score, label in zip(docs, scores.tolist(), labels.tolist()):
             pid = int(doc.get('product_id') or doc.get('id') or 0)
-            score, label = analyze_product(doc)
-            now_iso = datetime.now(timezone.utc).isoformat()
-            now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
             proc_doc = {
                 'product_id': pid,
                 'title': doc.get('title'),
@@ -66,37 +213,73 @@ def process_batch():
                 'last_processed': now_iso,
                 'timestamp': now_ms
             }
-            proc_col.update_one({'product_id': pid}, {'$set': proc_doc}, upsert=True)
-            # mark the raw document as processed so we don't re-process it
-            try:
-                raw_col.update_one({'_id': doc.get('_id')}, {'$set': {'processed': True, 'processed_at': now_ms}})
-            except Exception:
-                logger.exception("Failed to mark raw doc as processed: %s", doc.get('_id'))
-            processed_count += 1
-            all_proc.append(proc_doc)
+            proc_ops[pid] = UpdateOne({'product_id': pid}, {'$set': proc_doc}, upsert=True)
+        # write the whole batch in one round-trip, then advance the watermark past it
+        if proc_ops:
+            proc_col_fast.bulk_write(list(proc_ops.values()), ordered=False)
+            save_watermark(max(d['_id'] for d in docs))
+            # count raw docs, not upserts, so drain_backlog still sees full batches
+            processed_count = len(docs)
         # compute insights
-        if all_proc:
-            sorted_by_sent = sorted(all_proc, key=lambda x: x.get('sentiment_score',0), reverse=True)
-            insights = {
-                '_id': 'latest',
-                'generated_at': datetime.now(timezone.utc).isoformat(),
-                'top_positive': [ {'product_id':d['product_id'], 'title':d.get('title'), 'score':d.get('sentiment_score')} for d in sorted_by_sent[:5] ],
-                'top_negative': [ {'product_id':d['product_id'], 'title':d.get('title'), 'score':d.get('sentiment_score')} for d in sorted_by_sent[-5:] ],
-                'avg_sentiment': sum(d.get('sentiment_score',0) for d in all_proc)/len(all_proc)
-            }
-            insights_col.replace_one({'_id':'latest'}, insights, upsert=True)
+        proc_col.aggregate(INSIGHTS_PIPELINE)
         logger.info("Processed %d records; insights updated", processed_count)
     except errors.PyMongoError as e:
         logger.exception("Mongo error during processing: %s", e)
+        return 0
     except Exception as e:
         logger.exception("Unexpected error in processor: %s", e)
+        return 0
+    return processed_count
+
+def drain_backlog():
+    # a short or failed batch (process_batch returns 0 on errors) ends the drain,
+    # so a persistent write failure cannot spin re-reading the same backlog
+    while process_batch() >= BATCH_LIMIT:
+        pass
+
+def watch_inserts():
+    """Wake up on raw inserts from a change stream and drain the backlog in small batches.
+
+    Events are only a signal: documents are always read from the watermark, so a
+    failed batch is picked up again by the next drain instead of being skipped.
+    """
+    pipeline = [{'$match': {'operationType': 'insert'}}, {'$project': {'_id': 1}}]
+    # each idle getMore waits up to the flush interval, so an idle processor costs
+    # one round-trip per STREAM_FLUSH_SECONDS while flush latency stays bounded
+    with raw_col.watch(pipeline, max_await_time_ms=int(STREAM_FLUSH_SECONDS * 1000)) as stream:
+        # the stream is open now, so anything inserted before it is picked up here
+        drain_backlog()
+        pending = 0
+        deadline = 0.0
+        while stream.alive:
+            if stream.try_next() is not None:
+                if not pending:
+                    deadline = time.monotonic() + STREAM_FLUSH_SECONDS
+                pending += 1
+            if pending and (pending >= STREAM_BUFFER_SIZE or time.monotonic() >= deadline):
+                drain_backlog()
+                pending = 0
 
 def main():
-    logger.info("Processor started; running every %s seconds", PROCESS_INTERVAL)
+    logger.info("Processor started; watching %s.%s for inserts", RAW_DB, RAW_COLLECTION)
     try:
         while True:
-            process_batch()
-            time.sleep(PROCESS_INTERVAL)
+            try:
+                ensure_indexes()
+                load_watermark()
+                break
+            except errors.PyMongoError as e:
+                logger.exception("Startup failed; retrying in %s seconds: %s", PROCESS_INTERVAL, e)
+                time.sleep(PROCESS_INTERVAL)
+        while True:
+            try:
+                watch_inserts()
+            except errors.PyMongoError as e:
+                # e.g. stream invalidated, network error, or change streams unsupported
+                # (standalone server): fall back to a poll and reopen the stream
+                logger.exception("Change stream error; retrying in %s seconds: %s", PROCESS_INTERVAL, e)
+                time.sleep(PROCESS_INTERVAL)
+                drain_backlog()
     except KeyboardInterrupt:
         logger.info("Processor interrupted. Exiting.")
 
@@ -1,6 +1,8 @@
 
-import os, time, logging, requests
-from pymongo import MongoClient, errors
+import os, asyncio, logging
+import aiohttp
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne, errors
 import certifi
 from datetime import datetime, timezone
 
@@ -20,61 +22,150 @@ SOURCE_API = os.getenv("SOURCE_API", "https://fakestoreapi.com/products")
 # 'upsert' will update existing product documents by `product_id` (older behaviour).
 # Default is 'insert' so scrapes accumulate over time and processor can detect new items.
 SCRAPER_STRATEGY = os.getenv("SCRAPER_STRATEGY", "insert").lower()
+# retries (with exponential backoff) for connection errors/timeouts against SOURCE_API
+HTTP_RETRIES = 3
+HTTP_BACKOFF = 0.2
 
 if not MONGO_URI:
     logger.error("MONGO_URI is not set. Exiting.")
     raise SystemExit(1)
 
-client = MongoClient(MONGO_URI, tls=True, tlsCAFile=certifi.where(), serverSelectionTimeoutMS=5000)
+client = AsyncIOMotorClient(MONGO_URI, tls=True, tlsCAFile=certifi.where(), serverSelectionTimeoutMS=5000,
+                            maxPoolSize=32, minPoolSize=4, compressors='zstd,zlib', retryWrites=True, w='majority',
+                            uuidRepresentation='standard')
 db = client[RAW_DB]
 col = db[RAW_COLLECTION]
+migrations_col = db['migrations']
 
-def store_product(p):
-    """Store a product fetched from SOURCE_API according to `SCRAPER_STRATEGY`.
-
-    - If strategy is 'insert' (default) we insert a new document each run so history is kept.
-    - If strategy is 'upsert' we update the product document by `product_id` (original behaviour).
-    """
+def build_doc(p, now_ms):
+    """Normalize a product fetched from SOURCE_API into a raw document ingested at `now_ms`."""
     doc = dict(p)
     # normalize fields and add ingestion timestamp (ms)
     doc['product_id'] = int(doc.get('id', 0))
-    now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
     doc['ingested_at'] = now_ms
-    # keep original payload under raw_payload
-    doc['raw_payload'] = p
+    return doc
+
+# build_doc specialized to the source API's payload shape; compiled on first use
+# and recompiled whenever the first product of a response has different keys
+_packer = None
+_packer_keys = None
+
+def _compile_packer(keys):
+    """Generate a build_doc equivalent that builds the doc as one dict literal for `keys`."""
+    fields = ''.join('%r: p[%r], ' % (k, k) for k in keys)
+    src = ("def pack(p, now_ms):\n"
+           "    return {%s'product_id': int(p.get('id', 0)), 'ingested_at': now_ms}\n" % fields)
+    namespace = {}
+    exec(compile(src, '<scraper packer>', 'exec'), namespace)
+    return namespace['pack']
+
+def build_docs(items, now_ms):
+    """Normalize a list of products, using the specialized packer for items of the expected shape."""
+    global _packer, _packer_keys
+    if not items:
+        return []
+    keys = tuple(items[0])
+    if keys != _packer_keys:
+        _packer, _packer_keys = _compile_packer(keys), keys
+    pack, n = _packer, len(keys)
+    docs = []
+    for p in items:
+        # same key count and no missing key means exactly the packer's keys
+        if len(p) == n:
+            try:
+                docs.append(pack(p, now_ms))
+                continue
+            except KeyError:
+                pass
+        docs.append(build_doc(p, now_ms))
+    return docs
+
+async def drop_raw_payload():
+    """One-time cleanup of the `raw_payload` copy older scrapers stored on every doc.
+
+    Completion is recorded in the `migrations` collection so later starts skip the
+    (unindexed) scan of the raw collection.
+    """
+    try:
+        if await migrations_col.find_one({'_id': 'drop_raw_payload'}):
+            return
+        res = await col.update_many({'raw_payload': {'$exists': True}}, {'$unset': {'raw_payload': ''}})
+        if res.modified_count:
+            logger.info("Removed raw_payload from %d raw documents", res.modified_count)
+        now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+        await migrations_col.update_one({'_id': 'drop_raw_payload'}, {'$set': {'completed_at': now_ms}}, upsert=True)
+    except errors.PyMongoError as me:
+        logger.exception("Mongo error: %s", me)
+
+def _upsert_ops(docs):
+    return [UpdateOne({'product_id': d['product_id']}, {'$set': d}, upsert=True) for d in docs]
+
+async def store_products(docs):
+    """Store a batch of raw documents according to `SCRAPER_STRATEGY` in a single round-trip.
+
+    - If strategy is 'insert' (default) we insert new documents each run so history is kept.
+    - If strategy is 'upsert' we update the product documents by `product_id` (original behaviour).
+    """
+    if not docs:
+        return
     if SCRAPER_STRATEGY == 'upsert':
         # keep single document per product_id and update ingestion time
-        col.update_one({'product_id': doc['product_id']}, {'$set': doc}, upsert=True)
+        await col.bulk_write(_upsert_ops(docs), ordered=False)
     else:
-        # insert a new document each scrape so downstream processor can treat each as a new mention
+        # insert new documents each scrape so downstream processor can treat each as a new mention
         try:
-            col.insert_one(doc)
-        except Exception:
-            # fall back to upsert on failure (e.g., duplicate key)
-            col.update_one({'product_id': doc['product_id']}, {'$set': doc}, upsert=True)
+            await col.insert_many(docs, ordered=False)
+        except errors.BulkWriteError as bwe:
+            # fall back to upsert for the documents that failed (e.g., duplicate key)
+            failed = [docs[e['index']] for e in bwe.details.get('writeErrors', [])]
+            for d in failed:
+                d.pop('_id', None)
+            if failed:
+                await col.bulk_write(_upsert_ops(failed), ordered=False)
 
-def fetch_and_store():
+async def fetch_json(session):
+    for attempt in range(HTTP_RETRIES + 1):
+        try:
+            async with session.get(SOURCE_API, timeout=aiohttp.ClientTimeout(total=20)) as resp:
+                resp.raise_for_status()
+                return await resp.json(content_type=None)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt == HTTP_RETRIES:
+                raise
+            await asyncio.sleep(HTTP_BACKOFF * (2 ** attempt))
+
+async def fetch_and_store(session):
     try:
-        resp = requests.get(SOURCE_API, timeout=20)
-        resp.raise_for_status()
-        data = resp.json()
+        data = await fetch_json(session)
         if isinstance(data, list):
-            for item in data:
-                store_product(item)
-            logger.info("Stored %d products (strategy=%s)", len(data), SCRAPER_STRATEGY)
+            # one ingestion timestamp per poll
+            now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+            docs = build_docs(data, now_ms)
+            await store_products(docs)
+            logger.info("Stored %d products (strategy=%s)", len(docs), SCRAPER_STRATEGY)
         else:
             logger.warning("Unexpected response shape from source API")
-    except requests.RequestException as e:
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        # ValueError covers a non-JSON body (e.g. an HTML error page)
         logger.exception("Request failed: %s", e)
     except errors.PyMongoError as me:
         logger.exception("Mongo error: %s", me)
 
+async def run():
+    await drop_raw_payload()
+    # one session for the life of the process: the connection to SOURCE_API is kept
+    # alive across polls instead of paying a TCP+TLS handshake every interval
+    connector = aiohttp.TCPConnector(limit=4, keepalive_timeout=SCRAPE_INTERVAL + 30)
+    async with aiohttp.ClientSession(connector=connector, headers={'Accept-Encoding': 'gzip'}) as session:
+        while True:
+            # the interval timer runs alongside the fetch/store I/O, so a poll starts
+            # every SCRAPE_INTERVAL seconds unless the previous one takes longer
+            await asyncio.gather(fetch_and_store(session), asyncio.sleep(SCRAPE_INTERVAL))
+
 def main():
     logger.info("Starting scraper; scraping every %s seconds", SCRAPE_INTERVAL)
     try:
-        while True:
-            fetch_and_store()
-            time.sleep(SCRAPE_INTERVAL)
+        asyncio.run(run())
     except KeyboardInterrupt:
         logger.info("Scraper interrupted. Exiting.")
 